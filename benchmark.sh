@@ -2,6 +2,7 @@
 
 # Usage: benchmark.sh <NUMBER_OF_CARDS_TO_CREATE_AND_TEST> <CACHE_MODE>
 # Example: benchmark.sh 100 name
+# The timed run is saved as the calibration profile used by `cgc-cli.py --plan`.
 
 cards_count=$1
 cache_mode=$2
@@ -36,6 +37,10 @@ if [[ "$cards_count_current" -ne "$cards_count" ]]; then
 
 fi
 
+# The plan is made before the timed run. Only the megapixels of the cards that
+# will be converted (not cached) are used for the calibration profile.
+megapixels=$(cgc-cli.py --cache ${cache_mode} --plan | awk '$1 == "megapixels:" {print $2}')
+
 # The Linux kernel I/O cache is first flushed before starting to test to prevent inaccurate and faster-than-expected results.
-echo 3 | sudo tee /proc/sys/vm/drop_caches && sync && time cgc-cli.py --cache ${cache_mode}
+echo 3 | sudo tee /proc/sys/vm/drop_caches && sync && time cgc-cli.py --cache ${cache_mode} --calibrate ${megapixels}
 cd -
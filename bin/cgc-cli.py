@@ -2,9 +2,14 @@
 """A command-line interface utility for managing Card Games Converter (CGC)."""
 
 from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
 from os.path import join
-from sys import stderr
+from sys import exit as sys_exit, stderr, stdin
+from time import time
 from cgc.cgc import CGC
+from cgc.plan import CGCPlanner
+from cgc.service import serve
+import logging
 import tempfile
 
 
@@ -13,6 +18,7 @@ def main():
     initializing a CGC object.
     """
     log_level_arg = "INFO"
+    delimiter = "\n"
     tmp_dest_dir_arg = join(tempfile.gettempdir(), "cgc")
     parser = ArgumentParser()
     parser.add_argument("--src", help="the source directory")
@@ -23,8 +29,31 @@ def main():
                         type=int)
     parser.add_argument("--single", help="convert a single card to a" + \
                         " printable format.")
+    parser.add_argument("--stdin", help="read the paths of the cards to "
+                        "convert from stdin", action="store_true")
+    parser.add_argument("--manifest", help="a file listing the paths of the "
+                        "cards to convert")
+    parser.add_argument("-0", "--null", help="the paths from --stdin or "
+                        "--manifest are separated by NUL instead of newline "
+                        "characters", action="store_true")
     parser.add_argument("--cache", help="the cache mode to use: name, none, "
                         "or sha512 (default: none)", default="none", type=str)
+    parser.add_argument("--plan", help="estimate the resources needed to "
+                        "convert the source directory without converting it",
+                        action="store_true")
+    parser.add_argument("--calibrate", help="time the conversion and save "
+                        "it as the calibration profile used by --plan. Use "
+                        "the megapixels reported by --plan before the run.",
+                        metavar="MEGAPIXELS", type=float)
+    parser.add_argument("--serve", help="run an HTTP service that converts "
+                        "cards sent to /convert into a PDF", action="store_true")
+    parser.add_argument("--host", help="the address for --serve to listen on "
+                        "(default: 127.0.0.1)", default="127.0.0.1")
+    parser.add_argument("--port", help="the port for --serve to listen on "
+                        "(default: 8080)", default=8080, type=int)
+    parser.add_argument("--workers", help="the number of worker processes. "
+                        "By default, a new process is started for each card "
+                        "or one per CPU for --serve.", type=int)
     parser.add_argument("-v", help="verbose logging", action="store_true")
     parser.add_argument("--version", help="display the CGC version",
                         action="store_true")
@@ -36,6 +65,15 @@ def main():
     if args.dest:
         tmp_dest_dir_arg = args.dest
 
+    if args.null:
+        delimiter = "\0"
+
+    # The service creates a separate CGC object for each request.
+    if args.serve:
+        logging.basicConfig(level=log_level_arg)
+        serve(args.host, args.port, args.workers)
+        return
+
     # The destination directory must be set during initialization
     # to create the necessary directories.
     cgc = CGC(tmp_dest_dir=tmp_dest_dir_arg, log_level=log_level_arg)
@@ -52,6 +90,11 @@ def main():
     if args.ppi_width:
         cgc.height_physical_width = args.ppi_width
 
+    # Reuse a fixed number of worker processes instead of starting a new
+    # process for each card.
+    if args.workers:
+        cgc.pool = ProcessPoolExecutor(args.workers)
+
     if args.cache:
 
         if args.cache not in ["name", "none", "sha512"]:
@@ -61,12 +104,46 @@ def main():
             cgc.cache_mode = args.cache
 
     # The last argument to process is to see what action should be done
-    # (processing one or all cards).
-    if args.single:
-        cgc.convert_single(args.single)
+    # (planning, processing one, or processing all cards).
+    return_status = True
+
+    if args.plan:
+        plan = CGCPlanner(cgc).plan()
+
+        if plan is None:
+            return_status = False
+        else:
+
+            for key, value in plan.items():
+                print("{}: {}".format(key, value))
+
+    elif args.single:
+        return_status = cgc.convert_single(args.single)
+    elif args.stdin:
+        return_status = cgc.convert_batch_append_all(cgc.read_paths(stdin,
+                                                                    delimiter))
+    elif args.manifest:
+
+        with open(args.manifest, "r", encoding="utf-8") as manifest:
+            return_status = cgc.convert_batch_append_all(
+                cgc.read_paths(manifest, delimiter))
+
+    elif args.calibrate is not None:
+        time_start = time()
+        return_status = cgc.convert_batch_append_all()
+
+        if return_status:
+            CGCPlanner(cgc).calibration_save(time() - time_start,
+                                             args.calibrate)
+
     else:
-        cgc.convert_batch_append_all()
+        return_status = cgc.convert_batch_append_all()
+
+    if cgc.pool is not None:
+        cgc.pool.shutdown()
 
+    if not return_status:
+        sys_exit(1)
 
 if __name__ == '__main__':
     main()
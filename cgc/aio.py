@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""aio provides a single class named CGCAsync for converting cards into
+   printable pages from an asyncio event loop
+"""
+
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+from os import listdir
+from os.path import basename, isdir, join
+import img2pdf
+from cgc.cgc import CGC
+
+
+class CGCAsync(CGC):
+    """CGCAsync provides awaitable methods for converting cards into printable
+    pages. The CPU work runs in an executor.
+    """
+
+    def __init__(self, tmp_dest_dir=None, height_physical_inches=2.5,
+                 width_physical_inches=3.5, log_level="INFO"):
+        """Initialize CGCAsync. Each object uses its own temporary directory
+        by default so concurrent conversions do not overwrite each other.
+
+        Args:
+            tmp_dest_dir (str): The directory for the cards and pages. By
+                                default, a new temporary directory is
+                                created. It is not removed automatically.
+            height_physical_inches (int)
+            width_physical_inches (int)
+        """
+
+        if tmp_dest_dir is None:
+            tmp_dest_dir = join(tempfile.mkdtemp(prefix="cgc-"), "cgc")
+
+        super().__init__(tmp_dest_dir, height_physical_inches,
+                         width_physical_inches, log_level)
+        # The pages are returned instead so nothing would ever read the
+        # queue. A full queue blocks the interpreter from exiting.
+        self.queue = None
+
+    def page_convert(self, image_paths, page):
+        """Merge up to 8 individual cards into one printable page and convert
+        it into a PDF.
+
+        Args:
+            image_paths (list): The full path to each individual card.
+            page (int): The page number used to name the merged images.
+
+        Returns:
+            dict: The "page" number, the "image_path" of the page, the
+                  "pdf_path", and the "pdf_data" bytes.
+        """
+        vertical_paths = []
+
+        for stack in range(ceil(len(image_paths) / 4)):
+            vertical_name = str(page) + "-" + str(stack) + ".jpg"
+            self.images_merge("vertical", image_paths[stack * 4:stack * 4 + 4],
+                              vertical_name)
+            vertical_paths.append(join(self.tmp_dir_vertical, vertical_name))
+
+        self.images_merge("horizontal", vertical_paths, str(page) + ".jpg")
+        image_path = join(self.tmp_dir_horizontal, str(page) + ".jpg")
+        pdf_path = join(self.tmp_dir_pdfs, str(page) + ".pdf")
+        pdf_data = img2pdf.convert(image_path)
+
+        with open(pdf_path, "wb") as pdf_file:
+            pdf_file.write(pdf_data)
+
+        return {"page": page, "image_path": image_path, "pdf_path": pdf_path,
+                "pdf_data": pdf_data}
+
+    @staticmethod
+    async def executor_run(executor, method, *args):
+        """Run a method in an executor. If this is cancelled, a job that has
+        not started is cancelled and a job that is already running is waited
+        for before the cancellation continues. A running job cannot be
+        stopped and would otherwise keep writing files after the caller has
+        moved on.
+
+        Args:
+            executor (Executor): The executor to run the method in.
+            method (method): The method to run.
+            args: The arguments for the method.
+
+        Returns:
+            The return value of the method.
+        """
+        job = executor.submit(method, *args)
+        job_future = asyncio.wrap_future(job)
+
+        try:
+            return await asyncio.shield(job_future)
+        except asyncio.CancelledError:
+
+            if not job.cancel():
+                await asyncio.wait([job_future])
+
+            raise
+
+    async def apage_convert(self, image_paths, ppi, page, executor=None):
+        """Asynchronously convert up to 8 source cards into one printable page.
+        Each card is converted by "convert_single" in the executor before
+        "page_convert" merges them.
+
+        Args:
+            image_paths (list): The full path to each source card.
+            ppi (int): The desired pixels per inch density.
+            page (int): The page number.
+            executor (Executor): The executor to run the CPU work in. By
+                                 default, a new thread pool is used.
+
+        Returns:
+            dict: The page from "page_convert".
+        """
+
+        if executor is None:
+
+            with ThreadPoolExecutor() as thread_pool:
+                return await self.apage_convert(image_paths, ppi, page,
+                                                thread_pool)
+
+        # Cards with the same file name from different directories are kept
+        # by prefixing each one with its position in the deck.
+        individual_names = [str(page * 8 + card) + "-" + basename(image_path)
+                            for card, image_path in enumerate(image_paths)]
+        # Every card is finished before an error is raised so no job is left
+        # running.
+        results = await asyncio.gather(*[self.executor_run(executor,
+                                                           self.convert_single,
+                                                           image_path, ppi,
+                                                           individual_name)
+                                         for image_path, individual_name in
+                                         zip(image_paths, individual_names)],
+                                       return_exceptions=True)
+
+        for result in results:
+
+            if isinstance(result, BaseException):
+                raise result
+
+        individual_paths = [join(self.tmp_dir_individual, individual_name)
+                            for individual_name in individual_names]
+        return await self.executor_run(executor, self.page_convert,
+                                       individual_paths, page)
+
+    async def aconvert_pages(self, image_paths=None, executor=None):
+        """Asynchronously convert cards into printable pages and PDFs. Each
+        page is yielded as soon as it is ready. Only the next page is
+        converted while the caller handles the current one. Closing or
+        cancelling the iterator stops any page that has not started yet and
+        waits for the cards that are already being converted.
+
+        Args:
+            image_paths (iterable): The full path to each image to convert
+                                    instead of the source directory.
+            executor (Executor): The executor to run the CPU work in. By
+                                 default, a new thread pool is used.
+
+        Yields:
+            dict: Each page from "page_convert".
+        """
+        executor_owned = executor is None
+
+        if executor_owned:
+            # The pool is shut down when the iterator finishes or is closed.
+            # pylint: disable=R1732
+            executor = ThreadPoolExecutor()
+
+        page_next = None
+
+        try:
+
+            if image_paths is None:
+                image_names = await self.executor_run(executor, listdir,
+                                                      self.tmp_src_dir)
+                image_paths = [join(self.tmp_src_dir, image_name)
+                               for image_name in image_names]
+
+            image_paths = [image_path for image_path in image_paths
+                           if not isdir(image_path)]
+
+            if not image_paths:
+                return
+
+            image_info = await self.executor_run(executor, self.image_info,
+                                                 image_paths[0])
+            ppi = self.calc_ppi(image_info)
+            pages = [image_paths[card:card + 8]
+                     for card in range(0, len(image_paths), 8)]
+            page_next = asyncio.ensure_future(
+                self.apage_convert(pages[0], ppi, 0, executor))
+
+            for page in range(len(pages)):
+                page_current = page_next
+
+                if page + 1 < len(pages):
+                    page_next = asyncio.ensure_future(
+                        self.apage_convert(pages[page + 1], ppi, page + 1,
+                                           executor))
+
+                yield await page_current
+
+        finally:
+
+            if page_next is not None and not page_next.done():
+                page_next.cancel()
+                await asyncio.gather(page_next, return_exceptions=True)
+
+            if executor_owned:
+                executor.shutdown()
+
+    async def aconvert_deck(self, image_paths=None, executor=None):
+        """Asynchronously convert cards into printable pages and PDFs.
+
+        Args:
+            image_paths (iterable): The full path to each image to convert
+                                    instead of the source directory.
+            executor (Executor): The executor to run the CPU work in. By
+                                 default, a new thread pool is used.
+
+        Returns:
+            list: Every page from "page_convert".
+        """
+        return [page async for page in self.aconvert_pages(image_paths,
+                                                           executor)]
@@ -9,12 +9,15 @@ import tempfile
 from multiprocessing import Queue, Process
 from os import listdir, makedirs
 from os.path import basename, exists, isdir, join
+from shutil import rmtree
 from math import ceil
+from functools import partial
 from hashlib import sha512
 import img2pdf
 # Image processing library.
 from PIL import Image
 import pkg_resources
+from cgc.normalize import image_normalize
 
 
 class CGC:
@@ -43,6 +46,16 @@ class CGC:
         self.cgc_managed_dirs = [self.tmp_dest_dir, self.tmp_dir_individual,
                                  self.tmp_dir_horizontal, self.tmp_dir_vertical,
                                  self.tmp_dir_pdfs]
+        # Every card is converted once to the colour mode of a page. Any
+        # transparency is flattened onto the background colour. Cards with
+        # an embedded ICC profile are transformed to the "icc_profile" path.
+        self.page_mode = "RGB"
+        self.background_color = (255, 255, 255)
+        self.icc_profile = None
+        # An optional shared "concurrent.futures.ProcessPoolExecutor" of warm
+        # worker processes to use instead of starting a new process for each
+        # task.
+        self.pool = None
         self.queue = Queue()
 
         if not exists(self.tmp_dest_dir):
@@ -58,6 +71,15 @@ class CGC:
             except IOError as e:
                 logging.critical("Failed to create all temporary directories.\n%s", e)
 
+    def __getstate__(self):
+        """Leave out the queue and pool when the object is pickled to be sent
+        to a worker process of a pool.
+        """
+        state = self.__dict__.copy()
+        state["queue"] = None
+        state["pool"] = None
+        return state
+
     @staticmethod
     def get_version():
         """Returns the CGC package version string."""
@@ -149,18 +171,25 @@ class CGC:
         return True
 
     @staticmethod
-    def image_density_change(image_path_src, image_path_dest, ppi):
+    def image_density_change(image_path_src, image_path_dest, ppi,
+                             normalize=None):
         """Change the density of the pixels per inch of an image.
 
         Args:
             image_path_src (str): The original full image path to convert
             image_path_dest (str): The new full image path to save to
             ppi (int): The desired pixels per inch density
+            normalize (method): Optionally called with the image to return
+                                the image to save instead
 
         Returns:
             boolean: If the convert density command finished successfully
         """
         image = Image.open(image_path_src)
+
+        if normalize is not None:
+            image = normalize(image)
+
         image.save(image_path_dest, dpi=(ppi, ppi))
         return True
 
@@ -293,7 +322,10 @@ class CGC:
         image_widths_all = []
 
         for image in image_paths:
-            image_open = Image.open(image)
+            # Cards from "convert_single" are already in the page colour mode
+            # and ICC profile so pasting them does not convert them again.
+            image_open = image_normalize(Image.open(image), self.page_mode,
+                                         self.background_color)
             image_paths_open.append(image_open)
             image_heights += image_open.height
             image_heights_all.append(image_open.height)
@@ -313,7 +345,7 @@ class CGC:
                           Please use horizontal or vertical.")
             sys_exit(1)
 
-        merged_image = Image.new("RGB", (merged_width, merged_height))
+        merged_image = Image.new(self.page_mode, (merged_width, merged_height))
         merged_pixel_offset = 0
 
         for image in image_paths_open:
@@ -325,17 +357,25 @@ class CGC:
                 merged_image.paste(image, (merged_pixel_offset, 0))
                 merged_pixel_offset += image.width
 
-        self.queue.put(merged_image.save(join(self.tmp_dest_dir,
-                                              images_merge_method,
-                                              merged_image_name)))
+        merged_image_path = join(self.tmp_dest_dir, images_merge_method,
+                                 merged_image_name)
+        merged_image.save(merged_image_path)
+
+        # Workers of a pool do not have access to the queue.
+        if self.queue is not None:
+            self.queue.put(merged_image_path)
+
         return True
 
-    def convert_single(self, image_path_src, ppi=None):
+    def convert_single(self, image_path_src, ppi=None, image_name_dest=None):
         """Convert a single image to be a different density and rotate it
         90 degrees if it is vertical.
 
         Args:
             image_path_src (str): The image to convert
+            ppi (int): The desired pixels per inch density
+            image_name_dest (str): The file name to save the card as. By
+                                   default, the source file name is used.
 
         Returns:
             boolean: If any of the convert commands failed
@@ -346,11 +386,17 @@ class CGC:
             image_dimensions = self.image_info(image_path_src)
             ppi = self.calc_ppi(image_dimensions)
 
-        card_file_name = basename(image_path_src)
-        image_path_dest = join(self.tmp_dir_individual, card_file_name)
+        if image_name_dest is None:
+            image_name_dest = basename(image_path_src)
+
+        image_path_dest = join(self.tmp_dir_individual, image_name_dest)
+
+        normalize = partial(image_normalize, mode=self.page_mode,
+                            background_color=self.background_color,
+                            icc_profile=self.icc_profile)
 
-        if not self.image_density_change(image_path_src,
-                                         image_path_dest, ppi):
+        if not self.image_density_change(image_path_src, image_path_dest, ppi,
+                                         normalize):
             return False
 
         if not self.image_rotate_by_dimensions(image_path_dest):
@@ -358,6 +404,152 @@ class CGC:
 
         return True
 
+    def process_start(self, target, args):
+        """Run a method in the background. The shared pool is used if one is
+        set. Otherwise, a new process is started.
+
+        Args:
+            target (method): The method to run.
+            args (tuple): The arguments for the method.
+
+        Returns:
+            Process or Future: The handle to pass to "processes_wait".
+        """
+
+        if self.pool is not None:
+            return self.pool.submit(target, *args)
+
+        process = Process(target=target, args=args)
+        process.start()
+        return process
+
+    @staticmethod
+    def processes_wait(processes, names=None):
+        """Wait for all background methods started by "process_start" to
+        finish.
+
+        Args:
+            processes (list): The handles from "process_start".
+            names (list): A name for each handle to log if it failed.
+
+        Returns:
+            boolean: If all of the methods finished successfully
+        """
+        return_status = True
+
+        if names is None:
+            names = [str(process) for process in processes]
+
+        for process, name in zip(processes, names):
+
+            if isinstance(process, Process):
+                process.join()
+                process_failed = process.exitcode != 0
+            else:
+
+                # A worker that dies raises "BrokenProcessPool" instead of
+                # waiting forever.
+                try:
+                    process.result()
+                    process_failed = False
+                # Any error raised by the method is logged.
+                except Exception as e:  # pylint: disable=broad-except,C0103
+                    logging.error("%s", e)
+                    process_failed = True
+
+            if process_failed:
+                logging.error("Failed to process: %s", name)
+                return_status = False
+
+        return return_status
+
+    @staticmethod
+    def read_paths(stream, delimiter="\n"):
+        """Read delimited paths from a stream as they arrive.
+
+        Args:
+            stream (file): A text stream such as stdin or a manifest file.
+            delimiter (str): The character between paths. Use "\0" for the
+                             output of "find -print0".
+
+        Yields:
+            str: Each path read from the stream.
+        """
+        path = ""
+
+        for char in iter(lambda: stream.read(1), ""):
+
+            if char == delimiter:
+
+                if path:
+                    yield path.rstrip("\r")
+
+                path = ""
+            else:
+                path += char
+
+        if path:
+            yield path.rstrip("\r")
+
+    def convert_batch_paths(self, image_paths, ppi=None, unique_names=False):
+        """Convert each image from an iterable of paths to be a different
+        density and rotate them if needed. A conversion is started as soon
+        as each path is read so a stream of paths does not have to finish
+        first.
+
+        Args:
+            image_paths (iterable): The full path to each image.
+            ppi (int): The desired pixels per inch density. By default, it is
+                       calculated from the first image.
+            unique_names (boolean): Prefix the name of each converted card
+                                    with its position so cards with the same
+                                    file name from different directories do
+                                    not overwrite each other.
+
+        Returns:
+            boolean: If all of the cards were found and converted
+        """
+        processes = []
+        image_paths_started = []
+        return_status = True
+
+        for image_path_src in image_paths:
+
+            if isdir(image_path_src):
+                continue
+
+            if not exists(image_path_src):
+                logging.error("Card not found: %s", image_path_src)
+                return_status = False
+                continue
+
+            if ppi is None:
+
+                try:
+                    ppi = self.calc_ppi(self.image_info(image_path_src))
+                # pylint: disable=C0103
+                except IOError as e:
+                    logging.error("Failed to read the card: %s\n%s",
+                                  image_path_src, e)
+                    return_status = False
+                    continue
+
+            image_name_dest = None
+
+            if unique_names:
+                image_name_dest = str(len(image_paths_started)) + "-" + \
+                                  basename(image_path_src)
+
+            processes.append(self.process_start(self.convert_single,
+                                                (image_path_src, ppi,
+                                                 image_name_dest)))
+            image_paths_started.append(image_path_src)
+
+        if not self.processes_wait(processes, image_paths_started):
+            return False
+
+        return return_status
+
     def convert_batch_directory(self, images_dir):
         """Convert an entire directory from a specified path to be
         a different density and rotate them if needed. (Both the
@@ -374,7 +566,6 @@ class CGC:
         first_image_info = self.image_info(first_image)
         ppi = self.calc_ppi(first_image_info)
         image_paths_src = []
-        processes = []
 
         if self.cache_mode == "name":
             image_paths_src = self.cache_mode_name()
@@ -385,18 +576,7 @@ class CGC:
             for image in listdir(images_dir):
                 image_paths_src.append(join(images_dir, image))
 
-        for image_path_src in image_paths_src:
-
-            if not isdir(image_path_src):
-                convert_single_p = Process(target=self.convert_single,
-                                           args=(image_path_src, ppi))
-                processes.append(convert_single_p)
-                convert_single_p.start()
-
-        for process in processes:
-            process.join()
-
-        return True
+        return self.convert_batch_paths(image_paths_src, ppi)
 
     def convert_batch_append(self, append_method):
         """Merge individual images in batches of 4 vertically
@@ -435,11 +615,9 @@ class CGC:
             image_paths.append(join(tmp_dir_append, image))
 
             if image_count >= image_count_max:
-                images_merge_p = Process(target=self.images_merge,
-                                         args=(append_method, image_paths,
-                                               str(total_count) + ".jpg"))
-                processes.append(images_merge_p)
-                images_merge_p.start()
+                processes.append(self.process_start(self.images_merge,
+                                                    (append_method, image_paths,
+                                                     str(total_count) + ".jpg")))
                 # Reset the count and paths if 2 (horizontal) or 4 (veritcal)
                 # cards have been processed already.
                 image_count = 0
@@ -454,10 +632,7 @@ class CGC:
                                              str(total_count) + ".jpg"):
                         return False
 
-        for process in processes:
-            process.join()
-
-        return True
+        return self.processes_wait(processes)
 
     def convert_to_pdf(self):
         """Convert all images from the horizontal directory into PDFs.
@@ -477,20 +652,34 @@ class CGC:
 
         return True
 
-    def convert_batch_append_all(self):
+    def convert_batch_append_all(self, image_paths=None):
         """Merge all individual cards into a printable set. The cards are
         assumed to have already had their density changed and have been
         rotated by the "convert_batch_directory" method. "convert_batch_append"
         will process both "vertical" and "horizontal" appending.
 
         Args:
-            None
+            image_paths (iterable): The full path to each image to convert
+                                    instead of the source directory. Any
+                                    cards and pages from an earlier run are
+                                    removed first.
 
         Returns:
             boolean: If any of the methods failed
         """
 
-        if not self.convert_batch_directory(self.tmp_src_dir):
+        if image_paths is not None:
+
+            # Only the listed cards are printed so anything left from an
+            # earlier run is removed first.
+            for tmp_dir in self.cgc_managed_dirs[1:]:
+                rmtree(tmp_dir, ignore_errors=True)
+                makedirs(tmp_dir)
+
+            if not self.convert_batch_paths(image_paths, unique_names=True):
+                return False
+
+        elif not self.convert_batch_directory(self.tmp_src_dir):
             return False
 
         if not self.convert_batch_append(append_method="vertical"):
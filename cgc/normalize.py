@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""normalize provides functions for converting card images to the colour mode
+   of a printable page
+"""
+
+import logging
+from functools import lru_cache
+from io import BytesIO
+# Image processing library.
+from PIL import Image, ImageCms
+
+
+@lru_cache(maxsize=16)
+def icc_transform(icc_profile_src, icc_profile_dest, mode_src, mode_dest):
+    """Build an ICC colour transform. Transforms are cached because they are
+    the same for every card from the same source.
+
+    Args:
+        icc_profile_src (bytes): The ICC profile embedded in an image
+        icc_profile_dest (str): The full path to the destination ICC profile
+        mode_src (str): The colour mode of the image
+        mode_dest (str): The colour mode to transform to
+
+    Returns:
+        ImageCmsTransform: The transform to apply to images.
+    """
+    return ImageCms.buildTransform(
+        ImageCms.ImageCmsProfile(BytesIO(icc_profile_src)),
+        ImageCms.getOpenProfile(icc_profile_dest), mode_src, mode_dest)
+
+
+def image_normalize(image, mode="RGB", background_color=(255, 255, 255),
+                    icc_profile=None):
+    """Convert an image to a colour mode. Palette images are expanded,
+    transparency is flattened onto a background colour, and 16-bit and 32-bit
+    greyscale images are scaled down to 8-bit. An image that is already in the
+    colour mode without any transparency is returned as-is.
+
+    Args:
+        image (Image): The PIL image to convert
+        mode (str): The colour mode to convert to
+        background_color (tuple): The RGB colour behind transparent pixels
+        icc_profile (str): The full path to an ICC profile to transform images
+                           with an embedded ICC profile to
+
+    Returns:
+        Image: The converted PIL image.
+    """
+    icc_profile_src = image.info.get("icc_profile")
+    mode_src = image.mode
+
+    if mode_src == mode and "transparency" not in image.info and \
+       (icc_profile is None or not icc_profile_src):
+        return image
+
+    if image.mode in ["P", "PA", "LA", "La", "RGBa"] or \
+       "transparency" in image.info:
+        image = image.convert("RGBA")
+
+    if image.mode == "RGBA":
+        background = Image.new("RGB", image.size, background_color)
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+
+    # Pillow clips these to the 8-bit range which turns most pixels white.
+    if image.mode == "I" or image.mode.startswith("I;16"):
+        image = image.convert("I").point(lambda value: value / 256) \
+                     .convert("L")
+
+    if icc_profile is not None and icc_profile_src:
+
+        try:
+            transform = icc_transform(icc_profile_src, icc_profile,
+                                      image.mode, mode)
+            return ImageCms.applyTransform(image, transform)
+        # A corrupt or truncated embedded profile raises "OSError".
+        except (ImageCms.PyCMSError, OSError) as e:
+            logging.warning("Failed to apply the ICC profile.\n%s", e)
+
+    image = image.convert(mode)
+
+    # The embedded ICC profile no longer describes the pixels.
+    if mode_src != mode:
+        image.info.pop("icc_profile", None)
+
+    return image
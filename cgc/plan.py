@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""plan provides a single class named CGCPlanner for estimating the resources
+   needed to convert cards without processing any images
+"""
+
+import json
+import logging
+from hashlib import sha512
+from math import ceil
+from os import cpu_count, listdir, makedirs, sysconf
+from os.path import dirname, exists, expanduser, getsize, isdir, join
+# Image processing library.
+from PIL import Image
+
+
+class CGCPlanner:
+    """CGCPlanner estimates the resources a CGC object needs to convert its
+    source directory.
+    """
+
+    def __init__(self, cgc,
+                 calibration_path=join(expanduser("~"), ".cgc",
+                                       "calibration.json")):
+        """Initialize CGCPlanner for a CGC object.
+
+        Args:
+            cgc (CGC): The CGC object to plan for
+            calibration_path (str): The calibration profile of this host
+        """
+        self.cgc = cgc
+        self.calibration_path = calibration_path
+
+    @staticmethod
+    def image_header(image_path):
+        """Read the header of an image without decoding the pixel data.
+
+        Args:
+            image_path (str)
+
+        Returns:
+            dict: width, height, bands, and format. None is returned if the
+                  file is not an image that can be opened.
+        """
+
+        try:
+
+            with Image.open(image_path) as image:
+                header = {"width": image.width, "height": image.height,
+                          "bands": len(image.getbands()),
+                          "format": image.format}
+
+        except (IOError, SyntaxError):
+            logging.debug("Not an image: %s", image_path)
+            return None
+
+        return header
+
+    @staticmethod
+    def file_sha512(file_path):
+        """Return the SHA512 checksum of a file.
+
+        Args:
+            file_path (str)
+
+        Returns:
+            str: The hexadecimal checksum.
+        """
+
+        with open(file_path, "rb") as file:
+            return sha512(file.read()).hexdigest()
+
+    @staticmethod
+    def memory_available():
+        """Return the amount of physical memory that is currently available.
+
+        Args:
+            None
+
+        Returns:
+            int: The available memory in bytes or None if it is unknown.
+        """
+
+        try:
+            return sysconf("SC_PAGE_SIZE") * sysconf("SC_AVPHYS_PAGES")
+        except (ValueError, OSError):
+            return None
+
+    def calibration_load(self):
+        """Load the calibration profile recorded on this host by
+        "calibration_save".
+
+        Args:
+            None
+
+        Returns:
+            dict: The calibration profile or None if one was not found.
+        """
+
+        if not exists(self.calibration_path):
+            return None
+
+        with open(self.calibration_path, "r", encoding="utf-8") as calibration_file:
+            return json.load(calibration_file)
+
+    def calibration_save(self, seconds, megapixels):
+        """Save a calibration profile based on a timed run of
+        "convert_batch_append_all" for estimating future run times.
+
+        Args:
+            seconds (float): How long the run took
+            megapixels (float): The total megapixels of the cards that were
+                                converted during the run
+
+        Returns:
+            boolean: If the profile was saved successfully
+        """
+
+        if megapixels <= 0:
+            logging.error("No cards were converted. The calibration profile "
+                          "was not saved.")
+            return False
+
+        calibration = {"seconds": seconds, "megapixels": megapixels,
+                       "cpu_count": cpu_count(),
+                       "seconds_per_megapixel": seconds / megapixels}
+        makedirs(dirname(self.calibration_path), exist_ok=True)
+
+        with open(self.calibration_path, "w", encoding="utf-8") as calibration_file:
+            json.dump(calibration, calibration_file, indent=4)
+
+        logging.debug("Calibration profile saved: %s", calibration)
+        return True
+
+    def paths_to_convert(self, src_dir):
+        """Find the same files that "convert_batch_directory" converts with
+        the cache mode of the CGC object.
+
+        Args:
+            src_dir (str): The source directory.
+
+        Returns:
+            list: The full path to each file that will be converted.
+        """
+
+        if self.cgc.cache_mode == "name":
+            return self.cgc.cache_mode_name(src_dir=src_dir)
+
+        if self.cgc.cache_mode == "sha512":
+            return self.cgc.cache_mode_sha512(src_dir=src_dir)
+
+        return list(self.cgc.listdir_full_path(src_dir))
+
+    def duplicates_count(self, cards):
+        """Count the cards that are exact copies of another card. Only the
+        cards with the same file size as another card are read to compare
+        their checksums.
+
+        Args:
+            cards (list): The cards from "plan_scan".
+
+        Returns:
+            int: The number of duplicate cards.
+        """
+        cards_by_bytes = {}
+        duplicates = 0
+
+        for card in cards:
+            cards_by_bytes.setdefault(card["bytes"], []).append(card["path"])
+
+        for card_paths in cards_by_bytes.values():
+
+            if len(card_paths) > 1:
+                checksums = [self.file_sha512(card_path)
+                             for card_path in card_paths]
+                duplicates += len(checksums) - len(set(checksums))
+
+        return duplicates
+
+    def plan_scan(self, src_dir):
+        """Scan the header of every file in a directory.
+
+        Args:
+            src_dir (str): The source directory to scan.
+
+        Returns:
+            list: cards, a list of dicts from "image_header" with the
+                  "path", "bytes", and "ppi" keys added
+            list: skipped, the full path to each file that is not an image
+        """
+        cards = []
+        skipped = []
+
+        for src_full_path in self.cgc.listdir_full_path(src_dir):
+            header = None
+
+            if not isdir(src_full_path):
+                header = self.image_header(src_full_path)
+
+            if header is None:
+                skipped.append(src_full_path)
+                continue
+
+            header["path"] = src_full_path
+            header["bytes"] = getsize(src_full_path)
+            header["ppi"] = self.cgc.calc_ppi([header["width"],
+                                               header["height"]])
+            cards.append(header)
+
+        return cards, skipped
+
+    def ppi_used(self, src_dir, cards):
+        """Find the PPI that "convert_batch_directory" uses for every card.
+        It is the PPI of the first file in the directory.
+
+        Args:
+            src_dir (str): The source directory.
+            cards (list): The cards from "plan_scan".
+
+        Returns:
+            int: The PPI or None if the first file is not an image.
+        """
+
+        if not listdir(src_dir):
+            return None
+
+        first_image = self.cgc.find_first_image(src_dir)
+
+        for card in cards:
+
+            if card["path"] == first_image:
+                return card["ppi"]
+
+        logging.warning("The first file is not an image so the conversion "
+                        "will fail: %s", first_image)
+        return None
+
+    def plan(self, src_dir=None):
+        """Estimate the resources needed to run "convert_batch_append_all"
+        without processing any images.
+
+        Args:
+            src_dir (str): The source directory to plan for.
+
+        Returns:
+            dict: The number of cards, cards to convert, pages, duplicates,
+                  skipped files, image formats, megapixels to convert, the
+                  PPI spread, the estimated peak memory and output bytes, the
+                  estimated run time, and the suggested worker count. None
+                  is returned if the source directory does not exist.
+        """
+
+        if src_dir is None:
+            src_dir = self.cgc.tmp_src_dir
+
+        if not isdir(src_dir):
+            logging.error("The source directory does not exist: %s", src_dir)
+            return None
+
+        cards, skipped = self.plan_scan(src_dir)
+        paths_to_convert = set(self.paths_to_convert(src_dir))
+        pixels = sum(card["width"] * card["height"] for card in cards)
+        megapixels = sum(card["width"] * card["height"] for card in cards
+                         if card["path"] in paths_to_convert) / 1000000
+        # Every card is decoded by its own process and later pasted into an
+        # RGB canvas while all of the other stacks are merged in parallel.
+        card_memory = [card["width"] * card["height"] * (card["bands"] + 3)
+                       for card in cards]
+        # Individual cards keep their source format. The vertical and
+        # horizontal pages are saved as JPEGs which the PDFs embed as-is.
+        page_bytes = ceil(pixels * 0.3)
+        ppis = [card["ppi"] for card in cards] or [0]
+        formats = {}
+
+        for card in cards:
+            formats[card["format"]] = formats.get(card["format"], 0) + 1
+
+        plan = {"cards": len(cards),
+                "cards_to_convert": len([card for card in cards
+                                         if card["path"] in paths_to_convert]),
+                "skipped": skipped, "formats": formats,
+                "duplicates": self.duplicates_count(cards),
+                "ppi_min": min(ppis), "ppi_max": max(ppis),
+                "ppi_used": self.ppi_used(src_dir, cards),
+                "pages_vertical": ceil(len(cards) / 4),
+                "pages_horizontal": ceil(len(cards) / 8),
+                "megapixels": round(megapixels, 3),
+                "memory_peak_bytes": sum(card_memory),
+                "output_bytes": sum(card["bytes"] for card in cards) + \
+                                page_bytes * 3,
+                "seconds": None, "workers": None}
+        calibration = self.calibration_load()
+
+        if calibration is not None:
+            plan["seconds"] = round(calibration["seconds_per_megapixel"] *
+                                    megapixels, 1)
+
+        workers = min(cpu_count() or 1, max(len(cards), 1))
+        memory_available = self.memory_available()
+
+        if memory_available is not None and card_memory:
+            workers = max(1, min(workers, memory_available // max(card_memory)))
+
+        plan["workers"] = workers
+        return plan
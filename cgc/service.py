@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""service provides a long-running HTTP server that converts uploaded cards
+   into a printable PDF
+"""
+
+import logging
+import tarfile
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+from multiprocessing import get_all_start_methods, get_context
+from os import cpu_count, listdir, makedirs, remove
+from os.path import basename, join
+from shutil import rmtree
+from socketserver import ThreadingMixIn
+from threading import Lock
+import img2pdf
+from PIL import Image
+from cgc.cgc import CGC
+from cgc.plan import CGCPlanner
+
+
+class BodyTooLargeError(Exception):
+    """The request body or the files in its archive are larger than the
+    maximum size allowed by the service.
+    """
+
+
+class CGCService(ThreadingMixIn, HTTPServer):
+    """CGCService handles each request in a new thread. All requests share a
+    pool of warm worker processes.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, workers=None,
+                 max_body_bytes=256 * 1024 * 1024):
+        """Initialize the HTTP server and start the worker processes.
+
+        Args:
+            server_address (tuple): host, port
+            workers (int): The number of worker processes. By default, one is
+                           started for each CPU.
+            max_body_bytes (int): The maximum size of a request body and of
+                                  all of the files extracted from it.
+        """
+        super().__init__(server_address, CGCRequestHandler)
+        self.workers = workers or cpu_count() or 1
+        self.max_body_bytes = max_body_bytes
+        self.pool_lock = Lock()
+        self.pool = self.pool_start()
+
+    def pool_start(self):
+        """Start a pool of worker processes and wait for all of them to be
+        ready. Forking from a process with other threads running can
+        deadlock so the workers are started by a fork server where it is
+        available.
+
+        Returns:
+            ProcessPoolExecutor: The pool of worker processes.
+        """
+        mp_context = None
+
+        if "forkserver" in get_all_start_methods():
+            mp_context = get_context("forkserver")
+
+        # The pool stays open until "server_close" is called.
+        # pylint: disable=R1732
+        pool = ProcessPoolExecutor(self.workers, mp_context=mp_context)
+
+        for job in [pool.submit(int) for _ in range(self.workers)]:
+            job.result()
+
+        return pool
+
+    def pool_check(self):
+        """Replace the pool of worker processes if it is broken. A pool breaks
+        when one of its workers dies, such as from running out of memory.
+
+        Returns:
+            boolean: If the pool had to be replaced.
+        """
+
+        with self.pool_lock:
+
+            try:
+                self.pool.submit(int).result()
+            except BrokenProcessPool:
+                logging.warning("A worker process died. Restarting the pool.")
+                self.pool.shutdown(wait=False)
+                self.pool = self.pool_start()
+                return True
+
+        return False
+
+    def server_close(self):
+        """Stop the HTTP server and the worker processes."""
+        super().server_close()
+        self.pool.shutdown()
+
+
+class CGCRequestHandler(BaseHTTPRequestHandler):
+    """CGCRequestHandler converts the cards from the body of a POST request to
+    "/convert" and responds with a PDF. The body can be a single image or a
+    zip or tar archive of images.
+    """
+
+    @staticmethod
+    def body_cards(body):
+        """Find every card in a request body.
+
+        Args:
+            body (bytes): A single image or a zip or tar archive of images.
+
+        Yields:
+            tuple: The file name, the size, and a method that returns the
+                   data of each card.
+        """
+        body_file = BytesIO(body)
+
+        if zipfile.is_zipfile(body_file):
+
+            with zipfile.ZipFile(body_file) as archive:
+
+                for member in archive.infolist():
+
+                    if not member.filename.endswith("/"):
+                        yield (basename(member.filename), member.file_size,
+                               lambda member=member: archive.read(member))
+
+            return
+
+        body_file.seek(0)
+
+        try:
+
+            with tarfile.open(fileobj=body_file) as archive:
+
+                for member in archive.getmembers():
+
+                    if member.isfile():
+                        yield (basename(member.name), member.size,
+                               lambda member=member:
+                               archive.extractfile(member).read())
+
+            return
+
+        except tarfile.TarError:
+            pass
+
+        try:
+
+            with Image.open(BytesIO(body)) as image:
+                image_format = image.format.lower()
+
+        except (IOError, SyntaxError) as e:
+            raise ValueError("The body must be an image or a zip or tar "
+                             "archive.") from e
+
+        yield "1." + image_format, len(body), lambda: body
+
+    def body_save(self, body, cards_dir):
+        """Save every image from a request body into a directory. Any file
+        that is not an image is skipped. Each file name is prefixed with its
+        position in the body so files with the same name in different
+        directories of an archive are all saved.
+
+        Args:
+            body (bytes): A single image or a zip or tar archive of images.
+            cards_dir (str): The directory to save the cards to.
+
+        Returns:
+            int: The number of cards saved.
+        """
+        cards_count = 0
+        cards_bytes = 0
+
+        for card_index, (card_name, card_bytes, card_read) in \
+                enumerate(self.body_cards(body)):
+
+            # Skip hidden files such as the macOS "._" metadata in archives.
+            if card_name.startswith("."):
+                continue
+
+            cards_bytes += card_bytes
+
+            if cards_bytes > self.server.max_body_bytes:
+                raise BodyTooLargeError("The files in the archive are too "
+                                        "large.")
+
+            card_path = join(cards_dir, str(card_index) + "-" + card_name)
+
+            with open(card_path, "wb") as card_file:
+                card_file.write(card_read())
+
+            if CGCPlanner.image_header(card_path) is not None:
+                cards_count += 1
+            else:
+                logging.debug("Skipping upload that is not an image: %s",
+                              card_name)
+                # Remove it so it is not converted.
+                remove(card_path)
+
+        return cards_count
+
+    @staticmethod
+    def pdf_merge(images_dir):
+        """Convert all of the pages in a directory into a single PDF with one
+        page per image.
+
+        Args:
+            images_dir (str): The directory of pages named by their number.
+
+        Returns:
+            bytes: The PDF data.
+        """
+        images = sorted(listdir(images_dir),
+                        key=lambda image_name: int(image_name.split(".")[0]))
+        return img2pdf.convert([join(images_dir, image_name)
+                                for image_name in images])
+
+    def convert(self, body):
+        """Convert the cards from a request body in an isolated workspace.
+
+        Args:
+            body (bytes): A single image or a zip or tar archive of images.
+
+        Returns:
+            bytes: The PDF data or None if there were no cards.
+        """
+        workspace = tempfile.mkdtemp(prefix="cgc-")
+
+        try:
+            cgc = CGC(tmp_dest_dir=join(workspace, "cgc"),
+                      log_level=logging.getLogger().level)
+            cgc.tmp_src_dir = join(workspace, "cards")
+            cgc.pool = self.server.pool
+            makedirs(cgc.tmp_src_dir)
+
+            if self.body_save(body, cgc.tmp_src_dir) == 0:
+                return None
+
+            # Submitting to a broken pool raises "BrokenProcessPool" right
+            # away so the pool is checked after any failure.
+            try:
+                converted = cgc.convert_batch_append_all()
+            except BrokenProcessPool:
+                converted = False
+
+            if not converted:
+                self.server.pool_check()
+                raise RuntimeError("Failed to convert the cards.")
+
+            return self.pdf_merge(cgc.tmp_dir_horizontal)
+        finally:
+            rmtree(workspace)
+
+    def respond(self, status, content_type, content):
+        """Send a complete response.
+
+        Args:
+            status (int): The HTTP status code.
+            content_type (str): The MIME type of the content.
+            content (bytes)
+        """
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def body_read(self):
+        """Read the body of a request.
+
+        Returns:
+            bytes: The body.
+        """
+
+        try:
+            body_bytes = int(self.headers.get("Content-Length", 0))
+        except ValueError as e:
+            raise ValueError("The Content-Length header is invalid.") from e
+
+        if body_bytes < 0:
+            raise ValueError("The Content-Length header is invalid.")
+
+        if body_bytes > self.server.max_body_bytes:
+            raise BodyTooLargeError("The body is too large.")
+
+        return self.rfile.read(body_bytes)
+
+    # The method name is required by BaseHTTPRequestHandler.
+    # pylint: disable=C0103
+    def do_POST(self):
+        """Handle a POST request to "/convert"."""
+
+        if self.path.split("?")[0] != "/convert":
+            self.respond(404, "text/plain", b"Not found.\n")
+            return
+
+        try:
+            pdf_data = self.convert(self.body_read())
+        except BodyTooLargeError as e:
+            self.respond(413, "text/plain", str(e).encode() + b"\n")
+            return
+        except ValueError as e:
+            logging.error("Failed to read the request body.\n%s", e)
+            self.respond(400, "text/plain", str(e).encode() + b"\n")
+            return
+        # Any other error is reported to the client instead of dropping the
+        # connection.
+        except Exception as e:  # pylint: disable=broad-except
+            logging.exception("Failed to convert the request.\n%s", e)
+            self.respond(500, "text/plain",
+                         b"Failed to convert the cards.\n")
+            return
+
+        if pdf_data is None:
+            self.respond(400, "text/plain", b"No card images were found.\n")
+            return
+
+        self.respond(200, "application/pdf", pdf_data)
+
+
+def serve(host="127.0.0.1", port=8080, workers=None):
+    """Run the CGC service until it is interrupted.
+
+    Args:
+        host (str): The address to listen on.
+        port (int): The port to listen on.
+        workers (int): The number of worker processes.
+    """
+    service = CGCService((host, port), workers)
+    logging.info("CGC service listening on http://%s:%d/convert", host,
+                 service.server_port)
+
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.server_close()
@@ -1,14 +1,25 @@
 #!/usr/bin/env python3
 
+import asyncio
 import tempfile
 import unittest
-from os import listdir, makedirs, remove
-from os.path import basename, exists, isfile, join
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.client import HTTPConnection
+from os import _exit as os_exit, listdir, makedirs, remove
+from os.path import basename, dirname, exists, isfile, join
 from shutil import copyfile, rmtree
-from PIL import Image
+from PIL import Image, ImageCms
 import urllib.request
 import ssl
+import zipfile
+from io import BytesIO, StringIO
+from threading import Thread
+from time import sleep
+from cgc.aio import CGCAsync
 from cgc.cgc import CGC
+from cgc.normalize import icc_transform, image_normalize
+from cgc.plan import CGCPlanner
+from cgc.service import BodyTooLargeError, CGCRequestHandler, CGCService
 
 
 class CGCUnitTests(unittest.TestCase):
@@ -34,6 +45,9 @@ class CGCUnitTests(unittest.TestCase):
                                                 str(count) + ".jpg"))
 
         self.cgc = CGC(log_level="DEBUG")
+        self.cgc_async = CGCAsync(log_level="DEBUG")
+        self.planner = CGCPlanner(self.cgc, join(self.cgc.tmp_dest_dir,
+                                                 "calibration.json"))
         self.tmp_card = join(self.cgc.tmp_dest_dir, "123.jpg")
 
     def test_find_first_image(self):
@@ -102,6 +116,82 @@ class CGCUnitTests(unittest.TestCase):
         if image.info["dpi"][0] != 104 or image.info["dpi"][1] != 104:
             self.assertTrue(False)
 
+    def test_image_normalize(self):
+        image_rgb = Image.new("RGB", (4, 4), (10, 20, 30))
+        self.assertIs(image_normalize(image_rgb), image_rgb)
+
+        image_rgba = Image.new("RGBA", (4, 4), (10, 20, 30, 0))
+        image_rgba.putpixel((0, 0), (10, 20, 30, 255))
+        image_normalized = image_normalize(image_rgba,
+                                           background_color=(0, 255, 0))
+        self.assertEqual(image_normalized.mode, "RGB")
+        self.assertEqual(image_normalized.getpixel((0, 0)), (10, 20, 30))
+        self.assertEqual(image_normalized.getpixel((1, 1)), (0, 255, 0))
+
+        image_palette = image_rgba.convert("P")
+        image_palette.info["transparency"] = image_palette.getpixel((1, 1))
+        image_normalized = image_normalize(image_palette)
+        self.assertEqual(image_normalized.getpixel((1, 1)), (255, 255, 255))
+
+        # An RGB image with a transparent colour key should still be
+        # flattened.
+        image_rgb_key = Image.new("RGB", (4, 4), (10, 20, 30))
+        image_rgb_key.info["transparency"] = (10, 20, 30)
+        image_normalized = image_normalize(image_rgb_key)
+        self.assertEqual(image_normalized.getpixel((0, 0)), (255, 255, 255))
+
+        for mode in ["CMYK", "L"]:
+            image_normalized = image_normalize(Image.new(mode, (4, 4)))
+            self.assertEqual(image_normalized.mode, "RGB")
+
+        # 16-bit and 32-bit greyscale should be scaled instead of clipped.
+        for mode in ["I;16", "I"]:
+            image_normalized = image_normalize(Image.new(mode, (4, 4), 0x8000))
+            self.assertEqual(image_normalized.getpixel((0, 0)), (128, 128, 128))
+
+        # The profile of the source mode should not be kept after converting.
+        image_cmyk = Image.new("CMYK", (4, 4))
+        image_cmyk.info["icc_profile"] = b"CMYK profile"
+        self.assertNotIn("icc_profile", image_normalize(image_cmyk).info)
+        self.assertIn("icc_profile", image_cmyk.info)
+
+        self.assertEqual(image_normalize(image_rgb, mode="L").mode, "L")
+
+    def test_image_normalize_icc_profile(self):
+        icc_profile = join(self.cgc.tmp_dest_dir, "srgb.icc")
+        icc_profile_data = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+
+        with open(icc_profile, "wb") as icc_profile_file:
+            icc_profile_file.write(icc_profile_data)
+
+        image = Image.new("RGB", (4, 4), (10, 20, 30))
+        image.info["icc_profile"] = icc_profile_data
+        image_normalized = image_normalize(image, icc_profile=icc_profile)
+        self.assertIsNot(image_normalized, image)
+        self.assertEqual(image_normalized.mode, "RGB")
+        # The transform should be reused for the next image with the same profile.
+        cache_hits = icc_transform.cache_info().hits
+        image_normalize(image, icc_profile=icc_profile)
+        self.assertEqual(icc_transform.cache_info().hits, cache_hits + 1)
+
+        # A corrupt embedded profile should fall back to a plain conversion.
+        image_cmyk = Image.new("CMYK", (4, 4))
+        image_cmyk.info["icc_profile"] = b"garbage"
+        image_normalized = image_normalize(image_cmyk, icc_profile=icc_profile)
+        self.assertEqual(image_normalized.mode, "RGB")
+        self.assertNotIn("icc_profile", image_normalized.info)
+
+    def test_convert_single_normalize(self):
+        test_image_src = join(self.cgc.tmp_src_dir, "cmyk.jpg")
+        test_image_dest = join(self.cgc.tmp_dir_individual, "cmyk.jpg")
+        Image.open(self.last_image_card).convert("CMYK").save(test_image_src)
+        self.assertTrue(self.cgc.convert_single(test_image_src))
+
+        with Image.open(test_image_dest) as image:
+            self.assertEqual(image.mode, "RGB")
+
+        remove(test_image_src)
+
     def test_images_merge(self):
         card_1 = join(self.cgc.tmp_src_dir, "1.jpg")
         card_2 = join(self.cgc.tmp_src_dir, "2.jpg")
@@ -145,6 +235,78 @@ class CGCUnitTests(unittest.TestCase):
         if (len(individual_images) != 9) or (not return_status):
             self.assertTrue(False)
 
+    def test_read_paths(self):
+        self.assertEqual(list(self.cgc.read_paths(StringIO("1.jpg\n2 b.jpg\r\n\n3.jpg"))),
+                         ["1.jpg", "2 b.jpg", "3.jpg"])
+        self.assertEqual(list(self.cgc.read_paths(StringIO("1.jpg\0\n.jpg\0"),
+                                                  delimiter="\0")),
+                         ["1.jpg", "\n.jpg"])
+
+    def test_convert_batch_paths(self):
+        image_paths = [join(self.cards_source_dir, str(count) + ".jpg")
+                       for count in range(1, 4)]
+        return_status = self.cgc.convert_batch_paths(iter(image_paths))
+        individual_images = listdir(self.cgc.tmp_dir_individual)
+
+        if (len(individual_images) != 3) or (not return_status):
+            self.assertTrue(False)
+
+    def test_convert_batch_paths_missing(self):
+        image_paths = [join(self.cards_source_dir, "1.jpg"),
+                       join(self.cards_source_dir, "missing.jpg")]
+        self.assertFalse(self.cgc.convert_batch_paths(image_paths))
+
+        not_a_card = join(self.cards_source_dir, "notes.jpg")
+
+        with open(not_a_card, "w") as file:
+            file.write("not a card")
+
+        image_paths = [join(self.cards_source_dir, "1.jpg"), not_a_card]
+        self.assertFalse(self.cgc.convert_batch_paths(image_paths))
+        # The cards that exist are still converted.
+        self.assertEqual(listdir(self.cgc.tmp_dir_individual), ["1.jpg"])
+
+    def test_convert_batch_append_all_paths(self):
+        manifest = StringIO("\n".join(self.cgc.listdir_full_path(self.cards_source_dir)))
+        return_status = self.cgc.convert_batch_append_all(self.cgc.read_paths(manifest))
+        self.assertTrue(return_status)
+        self.assertEqual(len(listdir(self.cgc.tmp_dir_individual)), 9)
+        self.assertEqual(len(listdir(self.cgc.tmp_dir_pdfs)), 2)
+
+    def test_convert_batch_append_all_paths_subset(self):
+        image_paths = [join(self.cards_source_dir, str(count) + ".jpg")
+                       for count in range(1, 4)]
+        self.assertTrue(self.cgc.convert_batch_append_all(iter(image_paths)))
+        self.assertTrue(self.cgc.convert_batch_append_all(iter(image_paths[:1])))
+        # Only the card from the second manifest should be printed.
+        individual_images = listdir(self.cgc.tmp_dir_individual)
+        self.assertEqual(len(individual_images), 1)
+        self.assertEqual(len(listdir(self.cgc.tmp_dir_vertical)), 1)
+        self.assertEqual(len(listdir(self.cgc.tmp_dir_pdfs)), 1)
+
+        with Image.open(join(self.cgc.tmp_dir_individual,
+                             individual_images[0])) as card, \
+             Image.open(join(self.cgc.tmp_dir_vertical,
+                             listdir(self.cgc.tmp_dir_vertical)[0])) as page:
+            self.assertEqual(page.size, card.size)
+
+    def test_convert_batch_append_all_paths_same_name(self):
+        image_paths = []
+
+        for deck in ["deck1", "deck2"]:
+            makedirs(join(self.cards_source_dir, deck))
+            image_paths.append(join(self.cards_source_dir, deck, "0.jpg"))
+            copyfile(self.last_image_card, image_paths[-1])
+
+        self.assertTrue(self.cgc.convert_batch_append_all(iter(image_paths)))
+        # Both cards should be printed.
+        self.assertEqual(len(listdir(self.cgc.tmp_dir_individual)), 2)
+
+        with Image.open(self.last_image_card) as card, \
+             Image.open(join(self.cgc.tmp_dir_vertical,
+                             listdir(self.cgc.tmp_dir_vertical)[0])) as page:
+            self.assertEqual(page.height, card.width * 2)
+
     def test_convert_batch_append_all(self):
         return_status = self.cgc.convert_batch_append_all()
         self.cgc.convert_batch_append_all()
@@ -165,9 +327,303 @@ class CGCUnitTests(unittest.TestCase):
         if len(listdir_pdfs) != 2:
             self.assertTrue(False)
 
+    def test_convert_batch_append_all_pool(self):
+        self.cgc.pool = ProcessPoolExecutor(2)
+
+        try:
+            self.assertTrue(self.cgc.convert_batch_append_all())
+        finally:
+            self.cgc.pool.shutdown()
+
+        self.assertEqual(len(listdir(self.cgc.tmp_dir_individual)), 9)
+        self.assertEqual(len(listdir(self.cgc.tmp_dir_pdfs)), 2)
+
+    def test_image_header(self):
+        header = self.planner.image_header(self.last_image_card)
+        self.assertEqual([header["width"], header["height"]],
+                         list(self.cgc.image_info(self.last_image_card)))
+        self.assertIsNone(self.planner.image_header(__file__))
+
+    def test_calibration_save(self):
+        self.assertIsNone(self.planner.calibration_load())
+        self.assertFalse(self.planner.calibration_save(10, 0))
+        self.assertTrue(self.planner.calibration_save(10, 5))
+        self.assertEqual(self.planner.calibration_load()["seconds_per_megapixel"],
+                         2)
+
+    def test_duplicates_count(self):
+        checksums_read = []
+        file_sha512 = self.planner.file_sha512
+
+        def file_sha512_count(file_path):
+            checksums_read.append(file_path)
+            return file_sha512(file_path)
+
+        self.planner.file_sha512 = file_sha512_count
+        unique_card = join(self.cards_source_dir, "unique.png")
+        Image.open(self.last_image_card).save(unique_card)
+        cards, _ = self.planner.plan_scan(self.cards_source_dir)
+        # All of the cards except for the PNG are copies of the same image.
+        self.assertEqual(self.planner.duplicates_count(cards), 8)
+        # Only the cards with the same file size should be read.
+        self.assertNotIn(unique_card, checksums_read)
+        self.assertEqual(len(checksums_read), 9)
+
+    def test_ppi_used(self):
+        cards, _ = self.planner.plan_scan(self.cards_source_dir)
+        self.assertEqual(self.planner.ppi_used(self.cards_source_dir, cards),
+                         cards[0]["ppi"])
+        # The first file is not an image if it was skipped by the scan.
+        self.assertIsNone(self.planner.ppi_used(self.cards_source_dir, []))
+
+    def test_plan(self):
+        stray_file = join(self.cards_source_dir, "notes.txt")
+
+        with open(stray_file, "w") as file:
+            file.write("not a card")
+
+        plan = self.planner.plan()
+        self.assertEqual(plan["cards"], 9)
+        self.assertEqual(plan["cards_to_convert"], 9)
+        self.assertEqual(plan["skipped"], [stray_file])
+        # All of the cards are copies of the same image.
+        self.assertEqual(plan["duplicates"], 8)
+        self.assertEqual(plan["pages_vertical"], 3)
+        self.assertEqual(plan["pages_horizontal"], 2)
+        self.assertEqual(plan["ppi_min"], plan["ppi_max"])
+        self.assertIsNone(plan["seconds"])
+        self.planner.calibration_save(10, plan["megapixels"])
+        self.assertEqual(self.planner.plan()["seconds"], 10)
+        # Planning should not convert any images.
+        self.assertEqual(listdir(self.cgc.tmp_dir_individual), [])
+
+    def test_plan_missing(self):
+        self.assertIsNone(self.planner.plan(join(self.cards_source_dir,
+                                                 "missing")))
+
+    def test_plan_cache(self):
+        self.cgc.convert_batch_directory(self.cards_source_dir)
+        self.cgc.cache_mode = "name"
+        plan = self.planner.plan()
+        # Cached cards are not converted again so they are not counted in the
+        # megapixels used for calibrating.
+        self.assertEqual(plan["cards"], 9)
+        self.assertEqual(plan["cards_to_convert"], 0)
+        self.assertEqual(plan["megapixels"], 0)
+
+    def test_pdf_merge(self):
+        self.cgc.convert_batch_append_all()
+        pdf_data = CGCRequestHandler.pdf_merge(self.cgc.tmp_dir_horizontal)
+        self.assertTrue(pdf_data.startswith(b"%PDF"))
+        # There should be 2 pages (each with 1 and 8 images or 4 and 5 images).
+        self.assertIn(b"/Count 2", pdf_data)
+
+    def test_aconvert_deck(self):
+        cgc = self.cgc_async
+        loop = asyncio.new_event_loop()
+
+        with ProcessPoolExecutor(2) as executor:
+            pages = loop.run_until_complete(cgc.aconvert_deck(executor=executor))
+
+        loop.close()
+        # There should be 2 pages (each with 8 and 1 images).
+        self.assertEqual([page["page"] for page in pages], [0, 1])
+
+        for page in pages:
+            self.assertTrue(page["pdf_data"].startswith(b"%PDF"))
+            self.assertTrue(isfile(page["pdf_path"]))
+
+        self.assertEqual(len(listdir(cgc.tmp_dir_vertical)), 3)
+        # The pages are returned so nothing should be put on a queue.
+        self.assertIsNone(cgc.queue)
+
+    def test_aconvert_deck_concurrent(self):
+        cgc_other = CGCAsync(log_level="DEBUG")
+        image_paths = list(self.cgc.listdir_full_path(self.cards_source_dir))
+
+        async def decks():
+            return await asyncio.gather(
+                self.cgc_async.aconvert_deck(image_paths),
+                cgc_other.aconvert_deck(image_paths[:1]))
+
+        loop = asyncio.new_event_loop()
+
+        try:
+            deck, deck_other = loop.run_until_complete(decks())
+            # Each deck should have its own directory.
+            self.assertNotEqual(self.cgc_async.tmp_dest_dir,
+                                cgc_other.tmp_dest_dir)
+            self.assertEqual(len(deck), 2)
+            self.assertEqual(len(deck_other), 1)
+            self.assertEqual(len(listdir(self.cgc_async.tmp_dir_individual)), 9)
+            self.assertEqual(len(listdir(cgc_other.tmp_dir_individual)), 1)
+        finally:
+            loop.close()
+            rmtree(dirname(cgc_other.tmp_dest_dir))
+
+    def test_aconvert_pages(self):
+        cgc = self.cgc_async
+
+        async def first_page():
+            pages = cgc.aconvert_pages()
+            page = await pages.__anext__()
+            await pages.aclose()
+            return page
+
+        loop = asyncio.new_event_loop()
+        page = loop.run_until_complete(first_page())
+        loop.close()
+        self.assertEqual(page["page"], 0)
+        self.assertTrue(isfile(page["pdf_path"]))
+        # The first page has 8 cards.
+        self.assertGreaterEqual(len(listdir(cgc.tmp_dir_individual)), 8)
+
+    def test_aconvert_deck_cancel(self):
+        cgc = self.cgc_async
+        started = []
+        finished = []
+        convert_single = cgc.convert_single
+
+        def convert_single_slow(image_path_src, ppi=None, image_name_dest=None):
+            started.append(image_path_src)
+            sleep(0.5)
+            convert_single(image_path_src, ppi, image_name_dest)
+            finished.append(image_path_src)
+
+        cgc.convert_single = convert_single_slow
+
+        async def deck_cancel(executor):
+            deck = asyncio.ensure_future(cgc.aconvert_deck(executor=executor))
+            await asyncio.sleep(0.1)
+            deck.cancel()
+            await asyncio.gather(deck, return_exceptions=True)
+            return deck
+
+        loop = asyncio.new_event_loop()
+
+        with ThreadPoolExecutor(2) as executor:
+            deck = loop.run_until_complete(deck_cancel(executor))
+            # Every card that started converting should have finished before
+            # the cancellation completed.
+            self.assertTrue(deck.cancelled())
+            self.assertEqual(sorted(finished), sorted(started))
+
+        loop.close()
+        # The cards that had not started should never start.
+        self.assertLess(len(started), 9)
+
+    def test_service(self):
+        service = CGCService(("127.0.0.1", 0), workers=2)
+        Thread(target=service.serve_forever, daemon=True).start()
+        url = "http://127.0.0.1:{}/convert".format(service.server_port)
+        archive_data = BytesIO()
+
+        with zipfile.ZipFile(archive_data, "w") as archive:
+
+            for card in listdir(self.cards_source_dir):
+                archive.write(join(self.cards_source_dir, card),
+                              join("deck", card))
+
+            archive.writestr("deck/notes.txt", "not a card")
+
+        try:
+
+            with open(self.last_image_card, "rb") as card_file:
+                card_data = card_file.read()
+
+            for body in [archive_data.getvalue(), card_data]:
+
+                with urllib.request.urlopen(url, data=body) as response:
+                    self.assertEqual(response.headers["Content-Type"],
+                                     "application/pdf")
+                    self.assertTrue(response.read().startswith(b"%PDF"))
+
+            # A truncated card has a valid header but cannot be converted.
+            truncated_card = card_data[:2000]
+
+            for body, headers, status in [
+                    (b"not a card", {}, 400),
+                    (b"not a card", {"Content-Length": "ten"}, 400),
+                    (b"0" * 2048, {}, 413),
+                    (truncated_card, {}, 500)]:
+                service.max_body_bytes = 2047
+
+                if status == 500:
+                    service.max_body_bytes = 2048
+
+                connection = HTTPConnection("127.0.0.1", service.server_port)
+                connection.request("POST", "/convert", body=body,
+                                   headers=headers)
+                self.assertEqual(connection.getresponse().status, status)
+                connection.close()
+        finally:
+            service.shutdown()
+            service.server_close()
+
+        # The shared temporary directories should not be used.
+        self.assertEqual(listdir(self.cgc.tmp_dir_pdfs), [])
+
+    def test_body_save(self):
+        service = CGCService(("127.0.0.1", 0), workers=1)
+        handler = CGCRequestHandler.__new__(CGCRequestHandler)
+        handler.server = service
+        archive_data = BytesIO()
+
+        # Cards with the same name in different directories should all be
+        # saved.
+        with zipfile.ZipFile(archive_data, "w") as archive:
+
+            for deck in ["a", "b", "c"]:
+                archive.write(self.last_image_card, join(deck, "1.jpg"))
+
+        cards_dir = join(self.cgc.tmp_dest_dir, "uploads")
+        makedirs(cards_dir)
+
+        try:
+            self.assertEqual(handler.body_save(archive_data.getvalue(),
+                                               cards_dir), 3)
+            self.assertEqual(len(listdir(cards_dir)), 3)
+            service.max_body_bytes = 1
+
+            with self.assertRaises(BodyTooLargeError):
+                handler.body_save(archive_data.getvalue(), cards_dir)
+
+        finally:
+            service.server_close()
+
+    def test_pool_check(self):
+        service = CGCService(("127.0.0.1", 0), workers=1)
+
+        try:
+            # The workers should be started before any request is handled.
+            self.assertEqual(len(service.pool._processes), 1)
+            self.assertFalse(service.pool_check())
+            # A worker that dies breaks the pool so it should be replaced.
+            self.assertFalse(CGC.processes_wait(
+                [service.pool.submit(os_exit, 1)]))
+            self.assertTrue(service.pool_check())
+            self.assertEqual(len(service.pool._processes), 1)
+            self.assertFalse(service.pool_check())
+        finally:
+            service.server_close()
+
+    def test_processes_wait_pool(self):
+        self.cgc.pool = ProcessPoolExecutor(1)
+
+        try:
+            self.assertTrue(self.cgc.processes_wait(
+                [self.cgc.process_start(self.cgc.image_info,
+                                        (self.last_image_card,))]))
+            # A worker that dies should fail instead of waiting forever.
+            self.assertFalse(self.cgc.processes_wait(
+                [self.cgc.process_start(os_exit, (1,))]))
+        finally:
+            self.cgc.pool.shutdown()
+
     def tearDown(self):
         rmtree(self.cards_source_dir)
         rmtree(self.cgc.tmp_dest_dir)
+        rmtree(dirname(self.cgc_async.tmp_dest_dir))
 
 
 if __name__ == '__main__':